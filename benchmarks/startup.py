@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the startup time of mail_alias_creator.
+
+Runs the given scenarios in fresh interpreters with `-X importtime` and reports the cumulative import time.
+Exits with a non-zero exit code if a scenario exceeds its time budget or imports a module it should not need.
+
+Scenarios:
+ - import: Only import the main module (what every invocation pays, e.g. for --help).
+ - syntax: Run a syntax check (check_syntax_only = true) of a small alias file.
+
+Usage: python benchmarks/startup.py [--runs N] [--budget-ms MS]
+"""
+from typing import Dict, List, Set, Tuple
+
+from os import environ, path
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+CONFIG = """[main]
+check_syntax_only = true
+
+[LDAP]
+uri = ldap://localhost
+"""
+
+ALIASES = """meta:
+  name: benchmark
+  description: Aliases for the startup benchmark
+aliases:
+  benchmark@example.com:
+    entries:
+      - kind: user
+        user: benchmark
+"""
+
+SYNTAX_RUN = "import sys; sys.argv = ['mail_alias_creator', '-c', 'mac.conf', 'aliases.yml']; " \
+             "from mail_alias_creator.main import main; main()"
+
+# Name, code to run and the modules, which must not be imported.
+SCENARIOS: List[Tuple[str, str, List[str]]] = [
+    ("import", "import mail_alias_creator.main", ["ldap3", "yaml", "json"]),
+    ("syntax", SYNTAX_RUN, ["ldap3"]),
+]
+
+
+def measure(code: str, cwd: str) -> Tuple[float, Dict[str, int], Set[str]]:
+    """
+    Run the given code in a fresh interpreter.
+
+    Returns the total cumulative import time in ms, the cumulative import time in us of each top level import
+    and the names of all imported modules.
+    """
+    env = dict(environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    modules: Dict[str, int] = {}
+    imported: Set[str] = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        imported.add(name.strip())
+        # Top level imports are not indented.
+        if name.startswith(" ") and not name.startswith("  "):
+            modules[name.strip()] = int(cumulative)
+    return sum(modules.values()) / 1000, modules, imported
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of mail_alias_creator')
+    parser.add_argument('--runs', type=int, default=5, help='Number of runs per scenario. Defaults to 5.')
+    parser.add_argument('--budget-ms', type=float, default=100,
+                        help='Maximum allowed median import time per scenario in ms. Defaults to 100.')
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(path.join(tmp_dir, "mac.conf"), "w") as f:
+            f.write(CONFIG)
+        with open(path.join(tmp_dir, "aliases.yml"), "w") as f:
+            f.write(ALIASES)
+
+        for name, code, forbidden in SCENARIOS:
+            times: List[float] = []
+            modules: Dict[str, int] = {}
+            imported: Set[str] = set()
+            for _ in range(args.runs):
+                total, modules, imported = measure(code, tmp_dir)
+                times.append(total)
+            median = statistics.median(times)
+            print("{}: median {:.1f}ms, min {:.1f}ms, max {:.1f}ms".format(name, median, min(times), max(times)))
+            for module, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:5]:
+                print("  {:>8.1f}ms {}".format(cumulative / 1000, module))
+
+            unwanted = [module for module in forbidden if module in imported]
+            if unwanted:
+                print("  FAIL: imports {}".format(", ".join(unwanted)))
+                failed = True
+            if median > args.budget_ms:
+                print("  FAIL: exceeds budget of {:.1f}ms".format(args.budget_ms))
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,9 +28,9 @@ class GroupEP(EntryProcessor):
     def process(self, alias_address_provider):
         """Process."""
         logger.debug("Processing group EP with {}".format(self.group))
-        from ..main import LDAP
+        from ..main import DIRECTORY
 
-        tuples = LDAP.get_uids_and_primary_mails_for_group(self.group)
+        tuples = DIRECTORY.get_uids_and_primary_mails_for_group(self.group)
 
         for uid, mail in tuples:
             if mail is None:
@@ -31,9 +31,10 @@ class IncludeAliasEP(EntryProcessor):
         logger.debug("Processing include alias EP with {}".format(self.alias))
         addr: AliasAddress = alias_address_provider.getAlias(self.alias)
         if addr is None:
-            logger.error("Alias address given in include alias entry does not exist: {}".format(self.include))
+            logger.error("Alias address given in include alias entry does not exist: {}".format(self.alias))
             if CONFIG["main"].getboolean("strict"):
                 exit(1)
+            return
         senders, recipients = addr.get(alias_address_provider)
         self.add_senders(senders)
         self.add_recipients(recipients)
@@ -28,8 +28,8 @@ class UserEP(EntryProcessor):
     def process(self, alias_address_provider):
         """Process."""
         logger.debug("Processing user EP with {}".format(self.user))
-        from ..main import LDAP
-        mail = LDAP.get_user_primary_mails([self.user])[0][1]
+        from ..main import DIRECTORY
+        mail = DIRECTORY.get_user_primary_mails([self.user])[0][1]
         if mail is None:
             logger.error("User {} does not exist or has no primary mail.".format(self.user))
             if CONFIG["main"].getboolean("strict"):
@@ -1,5 +1,5 @@
 """Module containing some interface classes."""
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 
 
 class AliasAddress():
@@ -24,3 +24,19 @@ class AliasAddressProvider():
         Returns None if no alias address object with that address exists.
         """
         pass
+
+
+class DirectoryProvider():
+    """A provider of users, their primary mail addresses and groups (like the LDAP server)."""
+
+    def get_user_primary_mails(self, users: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """
+        Get a list of tuples of uids and the primary email addresses of the users with the given uids.
+
+        The mail address is None for users, which do not exist or have no primary mail.
+        """
+        pass
+
+    def get_uids_and_primary_mails_for_group(self, group: str) -> List[Tuple[str, Optional[str]]]:
+        """Get a tuple of uid and the primary email addresses for each user in the group."""
+        pass
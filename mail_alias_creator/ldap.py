@@ -1,31 +1,82 @@
 """Module for querying the LDAP server."""
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, List, Dict, Optional, Tuple, TypeVar
 
 import logging
+import time
 
-from ldap3 import Connection, Server, AUTO_BIND_NO_TLS, AUTO_BIND_TLS_BEFORE_BIND, SUBTREE
-from ldap3.core.exceptions import LDAPSocketOpenError, LDAPBindError
+from ldap3 import Connection, Server, AUTO_BIND_NO_TLS, AUTO_BIND_TLS_BEFORE_BIND
+from ldap3.core.exceptions import LDAPBindError, LDAPCommunicationError, LDAPResponseTimeoutError
+from ldap3.core.results import (RESULT_BUSY, RESULT_UNAVAILABLE, RESULT_UNWILLING_TO_PERFORM,
+                                RESULT_TIME_LIMIT_EXCEEDED, RESULT_ADMIN_LIMIT_EXCEEDED)
 from ldap3.utils.conv import escape_filter_chars
 
-from ldap3.utils.log import set_library_log_detail_level, OFF, BASIC, EXTENDED
+from .interface import DirectoryProvider
 
 from . import CONFIG
 
 logger: logging.Logger = logging.getLogger("ldap")
 
+T = TypeVar("T")
 
-class LDAPConnector():
+# Result codes of a degraded server, after which it is worth to try again, possibly with another server.
+TRANSIENT_RESULTS = (RESULT_BUSY, RESULT_UNAVAILABLE, RESULT_UNWILLING_TO_PERFORM,
+                     RESULT_TIME_LIMIT_EXCEEDED, RESULT_ADMIN_LIMIT_EXCEEDED)
+
+
+class TransientResultError(Exception):
+    """A request was answered with one of the TRANSIENT_RESULTS."""
+
+
+# Errors after which it is worth to try again, possibly with another server.
+TRANSIENT_ERRORS = (LDAPCommunicationError, LDAPResponseTimeoutError, TransientResultError)
+
+
+class ServerHealth():
+    """Latency and failure statistics of one of the configured servers."""
+
+    # Weight of a new measurement in the moving average of the latency.
+    LATENCY_WEIGHT: float = 0.3
+
+    def __init__(self, server: Server):
+        self.server: Server = server
+        # Moving average of the search latency in seconds. None if not measured yet.
+        self.latency: Optional[float] = None
+        # Number of failures since the last success.
+        self.failures: int = 0
+        # Time (time.monotonic) of the last failure.
+        self.last_failure: float = 0.0
+
+    def record_latency(self, seconds: float):
+        """Record a successful request, which took the given time."""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = (1 - self.LATENCY_WEIGHT) * self.latency + self.LATENCY_WEIGHT * seconds
+        self.failures = 0
+
+    def record_failure(self):
+        """Record a failed request."""
+        self.failures += 1
+        self.last_failure = time.monotonic()
+
+    def is_healthy(self, cooldown: float) -> bool:
+        """Whether the server did not fail within the last cooldown seconds."""
+        return self.failures == 0 or time.monotonic() - self.last_failure >= cooldown
+
+
+class LDAPConnector(DirectoryProvider):
     """Class with conenction to ldap server handling the LDAP interaction."""
 
-    server: Server = None
+    servers: List[ServerHealth] = None
 
     def __init__(self):
         """Init this class but not connect to the server yet."""
         ldap_config = CONFIG["LDAP"]
 
-        # The URL of the ldap server
-        self.ldap_uri: str = ldap_config.get("uri")
-        # The port of the ldap server. Use None for default.
+        # The URLs of the ldap servers, separated by whitespace or commas.
+        # All servers must serve the same directory. They are tried in the order of ordered_servers.
+        self.ldap_uris: List[str] = ldap_config.get("uri").replace(",", " ").split()
+        # The port of the ldap servers. Use None for default.
         self.port: Optional[int] = ldap_config.getint("port")
         # Whether to use ssl for the connection.
         self.ssl: bool = ldap_config.getboolean("ssl", fallback=False)
@@ -54,9 +105,102 @@ class LDAPConnector():
         # Whether to use the memberof field for simpler group lookups.
         # In this case the group_membership_field is not used.
         self.use_memberof: bool = ldap_config.getboolean("use_memberof", fallback=False)
+        # Seconds to wait for a server to accept a connection.
+        self.connect_timeout: float = ldap_config.getfloat("connect_timeout", fallback=5)
+        # Seconds to wait for a server to answer a request.
+        self.receive_timeout: float = ldap_config.getfloat("receive_timeout", fallback=10)
+        # How often to retry a request after a transient error (like a timeout).
+        self.retries: int = ldap_config.getint("retries", fallback=3)
+        # Seconds to wait before the first retry. The delay doubles with each further retry.
+        self.retry_backoff: float = ldap_config.getfloat("retry_backoff", fallback=0.5)
+        # Upper bound for the delay between two retries in seconds.
+        self.retry_backoff_max: float = ldap_config.getfloat("retry_backoff_max", fallback=8)
+        # Seconds for which a failed server is only used if no healthy server is left.
+        self.server_cooldown: float = ldap_config.getfloat("server_cooldown", fallback=60)
+
+        self.servers = [
+            ServerHealth(Server(uri, port=self.port, use_ssl=self.ssl, connect_timeout=self.connect_timeout))
+            for uri in self.ldap_uris
+        ]
+
+    def ordered_servers(self) -> List[ServerHealth]:
+        """
+        Get the servers in the order in which they should be tried.
+
+        Healthy servers come first, servers with unknown latency before measured ones and
+        otherwise the servers with the lowest latency first.
+        """
+        def key(health: ServerHealth):
+            measured = health.latency is not None
+            return (not health.is_healthy(self.server_cooldown), measured, health.latency if measured else 0.0)
+
+        return sorted(self.servers, key=key)
+
+    def connect(self, health: ServerHealth) -> Connection:
+        """Open and bind a connection to the given server."""
+        auto_bind = AUTO_BIND_NO_TLS
+        if self.start_tls:
+            auto_bind = AUTO_BIND_TLS_BEFORE_BIND
+        return Connection(health.server,
+                          user=self.bind_user,
+                          password=self.bind_user_password,
+                          auto_bind=auto_bind,
+                          read_only=True,
+                          receive_timeout=self.receive_timeout)
 
-        self.server = Server(self.ldap_uri, port=self.port, use_ssl=self.ssl, connect_timeout=5)
+    def run(self, operation: Callable[[Connection], T]) -> T:
+        """
+        Run the given operation with a connection to one of the servers.
+
+        After a transient error the next server is tried.
+        If all servers fail, the round is retried with exponential backoff.
+        Raises a ConnectionError if the operation fails nevertheless.
+        """
+        attempt = 0
+        last_error: Optional[Exception] = None
+        while True:
+            for health in self.ordered_servers():
+                try:
+                    with self.connect(health) as conn:
+                        return operation(conn)
+                except LDAPBindError as error:
+                    logger.warn("Unable to bind to LDAP Server.")
+                    raise ConnectionError("Unable to bind to LDAP Server.") from error
+                except TRANSIENT_ERRORS as error:
+                    logger.info("LDAP request to {} failed: {}".format(health.server.name, str(error)))
+                    health.record_failure()
+                    last_error = error
+            if attempt >= self.retries:
+                logger.warn("Unable to connect to LDAP Server.")
+                raise ConnectionError("Unable to connect to LDAP Server.") from last_error
+            delay = min(self.retry_backoff * 2 ** attempt, self.retry_backoff_max)
+            attempt += 1
+            logger.info("All LDAP servers failed. Retry {} of {} in {:.2f}s".format(attempt, self.retries, delay))
+            time.sleep(delay)
+
+    @classmethod
+    def check_result(cls, conn: Connection):
+        """Raise a TransientResultError if the last request of the connection got a transient result code."""
+        result = conn.result
+        if result and result.get("result") in TRANSIENT_RESULTS:
+            raise TransientResultError("{} ({}): {}".format(
+                result.get("description"), result.get("result"), result.get("message")))
+
+    def search(self, conn: Connection, search_base: str, search_filter: str, attributes: Optional[List[str]]) -> bool:
+        """
+        Search with the given connection and record the latency of the used server.
 
+        Raises a TransientResultError instead of returning False, if the server could not answer the search.
+        """
+        start = time.perf_counter()
+        found = conn.search(search_base, search_filter, attributes=attributes)
+        duration = time.perf_counter() - start
+        logger.debug("Search on {} took {:.3f}s".format(conn.server.name, duration))
+        LDAPConnector.check_result(conn)
+        for health in self.servers:
+            if health.server is conn.server:
+                health.record_latency(duration)
+        return found
 
     @classmethod
     def combine_filters(cls, filters: List[str], use_and: bool = False) -> str:
@@ -86,29 +230,20 @@ class LDAPConnector():
         combined_filter = LDAPConnector.combine_filters(filters)
         combined_filter = LDAPConnector.combine_filters([combined_filter, self.user_filter], use_and=True)
         logger.debug("Combined Filter: {}".format(combined_filter))
-        auto_bind = AUTO_BIND_NO_TLS
-        if self.start_tls:
-            auto_bind = AUTO_BIND_TLS_BEFORE_BIND
-        result_dict: Dict[str, str] = {}
-        try:
-            with Connection(self.server,
-                            user=self.bind_user,
-                            password=self.bind_user_password,
-                            auto_bind=auto_bind,
-                            read_only=True) as conn:
-                if conn.search(self.user_search_base,
-                               combined_filter,
-                               attributes=[self.user_uid_field,
-                                           self.user_primary_mail_field]):
-                    logger.debug("Found these entries: {}".format(str(conn.entries)))
-                    for entry in conn.entries:
-                        result_dict[entry[self.user_uid_field].value] = entry[self.user_primary_mail_field].value
-        except LDAPSocketOpenError as error:
-            logger.warn("Unable to connect to LDAP Server.")
-            raise ConnectionError("Unable to connect to LDAP Server.") from error
-        except LDAPBindError as error:
-            logger.warn("Unable to bind to LDAP Server.")
-            raise ConnectionError("Unable to bind to LDAP Server.") from error
+
+        def operation(conn: Connection) -> Dict[str, str]:
+            result_dict: Dict[str, str] = {}
+            if self.search(conn,
+                           self.user_search_base,
+                           combined_filter,
+                           attributes=[self.user_uid_field,
+                                       self.user_primary_mail_field]):
+                logger.debug("Found these entries: {}".format(str(conn.entries)))
+                for entry in conn.entries:
+                    result_dict[entry[self.user_uid_field].value] = entry[self.user_primary_mail_field].value
+            return result_dict
+
+        result_dict = self.run(operation)
 
         result: List[Tuple[str, Optional[str]]] = []
 
@@ -127,33 +262,24 @@ class LDAPConnector():
         filters = [self.group_filter, "(" + self.group_id_field + "=" + escape_filter_chars(group) + ")"]
         combined_filter = LDAPConnector.combine_filters(filters, use_and=True)
         logger.debug("Combined Filter: {}".format(combined_filter))
-        auto_bind = AUTO_BIND_NO_TLS
-        if self.start_tls:
-            auto_bind = AUTO_BIND_TLS_BEFORE_BIND
-        results: List[str] = []
-        try:
-            with Connection(self.server,
-                            user=self.bind_user,
-                            password=self.bind_user_password,
-                            auto_bind=auto_bind,
-                            read_only=True) as conn:
-                if conn.search(self.group_search_base,
-                               combined_filter,
-                               attributes=[self.group_membership_field]):
-                    logger.debug("Found these entries: {}".format(str(conn.entries)))
-                    for entry in conn.entries:
-                        value = entry[self.group_membership_field].value
-                        if type(value) is list:
-                            for member in value:
-                                results.append(member)
-                        elif value is not None: # value is None if group is empty
-                            results.append(value)
-        except LDAPSocketOpenError as error:
-            logger.warn("Unable to connect to LDAP Server.")
-            raise ConnectionError("Unable to connect to LDAP Server.") from error
-        except LDAPBindError as error:
-            logger.warn("Unable to bind to LDAP Server.")
-            raise ConnectionError("Unable to bind to LDAP Server.") from error
+
+        def operation(conn: Connection) -> List[str]:
+            results: List[str] = []
+            if self.search(conn,
+                           self.group_search_base,
+                           combined_filter,
+                           attributes=[self.group_membership_field]):
+                logger.debug("Found these entries: {}".format(str(conn.entries)))
+                for entry in conn.entries:
+                    value = entry[self.group_membership_field].value
+                    if type(value) is list:
+                        for member in value:
+                            results.append(member)
+                    elif value is not None: # value is None if group is empty
+                        results.append(value)
+            return results
+
+        results = self.run(operation)
 
         logger.debug("Result: {}".format(results))
         return results
@@ -172,45 +298,99 @@ class LDAPConnector():
         filters = [self.group_filter, "(" + self.group_id_field + "=" + escape_filter_chars(group) + ")"]
         combined_filter = LDAPConnector.combine_filters(filters, use_and=True)
         logger.debug("Combined Filter: {}".format(combined_filter))
-        auto_bind = AUTO_BIND_NO_TLS
-        if self.start_tls:
-            auto_bind = AUTO_BIND_TLS_BEFORE_BIND
-        try:
-            with Connection(self.server,
-                            user=self.bind_user,
-                            password=self.bind_user_password,
-                            auto_bind=auto_bind,
-                            read_only=True) as conn:
-                if conn.search(self.group_search_base,
-                            combined_filter,
-                            attributes=None):
-                    if len(conn.response) != 1:
-                        logger.warn("Expected to get 1 group, but got {}".format(len(conn.response)))
-                    entry = conn.response[0]
-                    logger.debug("Found this response: {}".format(str(entry)))
-                    group_dn = entry["dn"]
-                    logger.debug("Now searching members of this group")
-                    combined_filter = LDAPConnector.combine_filters(["(memberof={})".format(escape_filter_chars(group_dn)), self.user_filter], use_and=True)
-                    logger.debug("Combined Filter: {}".format(combined_filter))
-                    results: List[Tuple[str, Optional[str]]] = []
-                    if conn.search(self.user_search_base,
-                            combined_filter,
-                            attributes=[self.user_uid_field, self.user_primary_mail_field]):
-                        logger.debug("Found these entries: {}".format(str(conn.entries)))
-                        for entry in conn.entries:
-                            results.append((entry[self.user_uid_field].value, entry[self.user_primary_mail_field].value))
-                        return results
-                    else:
-                        logger.warn("Group {} has no members.".format(group))
-                        return []
+
+        def operation(conn: Connection) -> List[Tuple[str, Optional[str]]]:
+            if self.search(conn,
+                           self.group_search_base,
+                           combined_filter,
+                           attributes=None):
+                if len(conn.response) != 1:
+                    logger.warn("Expected to get 1 group, but got {}".format(len(conn.response)))
+                entry = conn.response[0]
+                logger.debug("Found this response: {}".format(str(entry)))
+                group_dn = entry["dn"]
+                logger.debug("Now searching members of this group")
+                member_filter = LDAPConnector.combine_filters(["(memberof={})".format(escape_filter_chars(group_dn)), self.user_filter], use_and=True)
+                logger.debug("Combined Filter: {}".format(member_filter))
+                results: List[Tuple[str, Optional[str]]] = []
+                if self.search(conn,
+                               self.user_search_base,
+                               member_filter,
+                               attributes=[self.user_uid_field, self.user_primary_mail_field]):
+                    logger.debug("Found these entries: {}".format(str(conn.entries)))
+                    for entry in conn.entries:
+                        results.append((entry[self.user_uid_field].value, entry[self.user_primary_mail_field].value))
+                    return results
                 else:
-                    logger.error("Cannot find the group {}".format(group))
-                    if CONFIG["main"].getboolean("strict"):
-                        exit(1)
+                    logger.warn("Group {} has no members.".format(group))
                     return []
-        except LDAPSocketOpenError as error:
-            logger.warn("Unable to connect to LDAP Server.")
-            raise ConnectionError("Unable to connect to LDAP Server.") from error
-        except LDAPBindError as error:
-            logger.warn("Unable to bind to LDAP Server.")
-            raise ConnectionError("Unable to bind to LDAP Server.") from error
+            else:
+                logger.error("Cannot find the group {}".format(group))
+                if CONFIG["main"].getboolean("strict"):
+                    exit(1)
+                return []
+
+        return self.run(operation)
+
+    @classmethod
+    def attribute_values(cls, attributes: Dict[str, Any], name: str) -> List[str]:
+        """Get the values of the given attribute of a search response as a list."""
+        value = attributes.get(name)
+        if value is None:
+            return []
+        if isinstance(value, list):
+            return value
+        return [value]
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        Get all valid users and groups in the format of a directory snapshot.
+
+        See the snapshot module for the format.
+        """
+        logger.info("Getting snapshot of all users and groups")
+        user_attributes = [self.user_uid_field, self.user_primary_mail_field]
+        if self.use_memberof:
+            user_attributes.append("memberOf")
+        group_attributes = [self.group_id_field]
+        if not self.use_memberof:
+            group_attributes.append(self.group_membership_field)
+
+        def operation(conn: Connection) -> Dict[str, Any]:
+            users: Dict[str, Dict[str, Any]] = {}
+            for entry in conn.extend.standard.paged_search(self.user_search_base,
+                                                           self.user_filter or "(objectClass=*)",
+                                                           attributes=user_attributes,
+                                                           generator=True):
+                if entry.get("type") != "searchResEntry":
+                    continue
+                attributes = entry["attributes"]
+                uids = LDAPConnector.attribute_values(attributes, self.user_uid_field)
+                if not uids:
+                    continue
+                mails = LDAPConnector.attribute_values(attributes, self.user_primary_mail_field)
+                users[uids[0]] = {
+                    "mail": mails[0] if mails else None,
+                    "memberOf": LDAPConnector.attribute_values(attributes, "memberOf"),
+                }
+            LDAPConnector.check_result(conn)
+            groups: Dict[str, Dict[str, Any]] = {}
+            for entry in conn.extend.standard.paged_search(self.group_search_base,
+                                                           self.group_filter or "(objectClass=*)",
+                                                           attributes=group_attributes,
+                                                           generator=True):
+                if entry.get("type") != "searchResEntry":
+                    continue
+                attributes = entry["attributes"]
+                ids = LDAPConnector.attribute_values(attributes, self.group_id_field)
+                if not ids:
+                    continue
+                members = []
+                if not self.use_memberof:
+                    members = LDAPConnector.attribute_values(attributes, self.group_membership_field)
+                groups[ids[0]] = {"dn": entry["dn"], "members": members}
+            LDAPConnector.check_result(conn)
+            logger.info("Got {} users and {} groups".format(len(users), len(groups)))
+            return {"users": users, "groups": groups}
+
+        return self.run(operation)
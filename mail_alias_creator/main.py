@@ -2,17 +2,17 @@
 from typing import List
 
 from os import environ, path
-from json import dump
 
 import argparse
 import logging
-import logging.config
 
 from . import CONFIG
-from .ldap import LDAPConnector
-from .process import Processor
+from .interface import DirectoryProvider
 
-LDAP: LDAPConnector = None
+# The subsystems (ldap3, yaml, ...) are imported in the functions using them,
+# so that only the ones actually needed are loaded. See benchmarks/startup.py.
+
+DIRECTORY: DirectoryProvider = None
 
 
 class EnvDefault(argparse.Action):
@@ -31,29 +31,53 @@ class EnvDefault(argparse.Action):
         setattr(namespace, self.dest, values)
 
 
-def run(config_file: str, alias_files: List[str]):
-    """Process the given alias files using the given config file."""
+def load_config(config_file: str):
+    """Load the given config file and the logging configuration referenced by it."""
     config_file_abs = path.abspath(config_file)
     dir_path = path.dirname(config_file_abs)
     CONFIG.read(config_file_abs)
     if "main" in CONFIG and "logging_conf" in CONFIG["main"]:
+        from logging.config import fileConfig
         logging_config_path = path.join(dir_path, CONFIG["main"]["logging_conf"])
-        logging.config.fileConfig(logging_config_path, disable_existing_loggers=False)
+        fileConfig(logging_config_path, disable_existing_loggers=False)
     logger = logging.getLogger("main")
     logger.info("Master log level: {}".format(logging.getLevelName(logging.root.level)))
 
-    global LDAP
-    LDAP = LDAPConnector()
+
+def create_directory() -> DirectoryProvider:
+    """Create the directory provider selected by the config."""
+    directory = CONFIG["main"].get("directory", "ldap")
+    if directory == "ldap":
+        from .ldap import LDAPConnector
+        return LDAPConnector()
+    elif directory == "snapshot":
+        from .snapshot import SnapshotDirectory
+        return SnapshotDirectory()
+    logging.getLogger("main").error("Unknown directory: {}".format(directory))
+    exit(1)
+
+
+def run(config_file: str, alias_files: List[str]):
+    """Process the given alias files using the given config file."""
+    from json import dump
+    from .process import Processor
+
+    load_config(config_file)
+
     processor = Processor()
     processor.load_files(alias_files)
     if CONFIG["main"].getboolean("check_syntax_only"):
         print("Done with syntax check. Not doing anything else.")
         return
+    global DIRECTORY
+    DIRECTORY = create_directory()
     processor.process()
     with open("sender_aliases.json", 'w') as f:
         dump(processor.sender_aliases, f)
     with open("recipient_aliases.json", 'w') as f:
         dump(processor.recipient_aliases, f)
+    with open("alias_index.json", 'w') as f:
+        dump(processor.get_index(), f)
 
 
 def main():
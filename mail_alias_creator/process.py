@@ -2,7 +2,6 @@
 from typing import List, Tuple, Dict, Any, Optional
 
 import logging
-import yaml
 
 from os import path, walk
 
@@ -103,6 +102,13 @@ class Processor(AliasAddressProvider):
         self.alias_definitions: Dict[str, AliasDefinition] = {}
         self.sender_aliases: List[Dict[str, str]] = []
         self.recipient_aliases: List[Dict[str, str]] = []
+        # Reverse indexes built while processing.
+        # uid -> aliases the user may send via
+        self.sender_index: Dict[str, List[str]] = {}
+        # address -> aliases forwarding to the address
+        self.recipient_index: Dict[str, List[str]] = {}
+        # alias -> aliases directly including the alias
+        self.included_by_index: Dict[str, List[str]] = {}
 
     def load_file(self, alias_file: str) -> List[AliasDefinition]:
         """
@@ -110,6 +116,8 @@ class Processor(AliasAddressProvider):
 
         The given file must exist
         """
+        import yaml
+
         logger.info("Getting aliases from {}".format(alias_file))
         alias_data: Dict[str, Any] = None
         with open(alias_file) as f:
@@ -152,11 +160,26 @@ class Processor(AliasAddressProvider):
                     "sender": sender,
                     "alias": alias_definition.mail
                 })
+                self.sender_index.setdefault(sender, []).append(alias_definition.mail)
             for recipient in recipients:
                 self.recipient_aliases.append({
                     "alias": alias_definition.mail,
                     "recipient": recipient
                 })
+                self.recipient_index.setdefault(recipient, []).append(alias_definition.mail)
+            for entry in alias_definition.entries:
+                if isinstance(entry, IncludeAliasEP) and entry.alias in self.alias_definitions:
+                    included_by = self.included_by_index.setdefault(entry.alias, [])
+                    if alias_definition.mail not in included_by:
+                        included_by.append(alias_definition.mail)
+
+    def get_index(self) -> Dict[str, Dict[str, List[str]]]:
+        """Get the reverse indexes built by process in the format read by the query module."""
+        return {
+            "senders": self.sender_index,
+            "recipients": self.recipient_index,
+            "included_by": self.included_by_index,
+        }
 
     def getAlias(self, alias) -> AliasAddress:
         """
@@ -0,0 +1,70 @@
+"""
+Module for querying the reverse indexes written by a run of the mail alias creator.
+
+The index file (alias_index.json) has the following format:
+
+```
+{
+  "senders": {"<uid>": ["<alias>", ...], ...},
+  "recipients": {"<address>": ["<alias>", ...], ...},
+  "included_by": {"<alias>": ["<alias including it>", ...], ...}
+}
+```
+"""
+from typing import Dict, List
+
+import argparse
+import json
+
+
+class AliasIndex():
+    """Reverse indexes from users, addresses and aliases to the aliases they belong to."""
+
+    def __init__(self, index_file: str):
+        """Load the given index file."""
+        with open(index_file) as f:
+            index = json.load(f)
+        self.senders: Dict[str, List[str]] = index.get("senders", {})
+        self.recipients: Dict[str, List[str]] = index.get("recipients", {})
+        self.included_by: Dict[str, List[str]] = index.get("included_by", {})
+
+    def aliases_of_sender(self, uid: str) -> List[str]:
+        """Get the aliases the user with the given uid may send via."""
+        return self.senders.get(uid, [])
+
+    def aliases_of_recipient(self, address: str) -> List[str]:
+        """Get the aliases forwarding to the given address."""
+        return self.recipients.get(address, [])
+
+    def aliases_including(self, alias: str) -> List[str]:
+        """Get the aliases directly including the given alias."""
+        return self.included_by.get(alias, [])
+
+
+def main():
+    """Run the query tool."""
+    parser = argparse.ArgumentParser(description='Query which aliases a user, address or alias belongs to')
+    parser.add_argument('--index', '-i', metavar='file', default="alias_index.json",
+                        help='The index file written by mail_alias_creator. Defaults to "./alias_index.json".')
+    parser.add_argument('--sender', '-s', metavar='uid', action='append', default=[],
+                        help='Show the aliases the user with this uid may send via. May be given multiple times.')
+    parser.add_argument('--recipient', '-r', metavar='address', action='append', default=[],
+                        help='Show the aliases forwarding to this address. May be given multiple times.')
+    parser.add_argument('--including', '-n', metavar='alias', action='append', default=[],
+                        help='Show the aliases directly including this alias. May be given multiple times.')
+
+    args = parser.parse_args()
+    if not (args.sender or args.recipient or args.including):
+        parser.error("At least one of --sender, --recipient or --including is required.")
+
+    index = AliasIndex(args.index)
+    for uid in args.sender:
+        print("sender {}: {}".format(uid, ", ".join(index.aliases_of_sender(uid))))
+    for address in args.recipient:
+        print("recipient {}: {}".format(address, ", ".join(index.aliases_of_recipient(address))))
+    for alias in args.including:
+        print("including {}: {}".format(alias, ", ".join(index.aliases_including(alias))))
+
+
+if __name__ == "__main__":
+    main()
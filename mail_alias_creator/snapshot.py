@@ -0,0 +1,274 @@
+"""
+Module for an offline directory backed by a snapshot of the LDAP directory.
+
+A snapshot is either a JSON file of the following format (as written by the exporter in this module):
+
+```
+{
+  "users": {
+    "<uid>": {"mail": "<primary mail or null>", "memberOf": ["<group dn>", ...]},
+    ...
+  },
+  "groups": {
+    "<group id>": {"dn": "<group dn>", "members": ["<uid>", ...]},
+    ...
+  }
+}
+```
+
+or an LDIF file containing the user and group entries.
+The entries of a snapshot are not filtered again, so it should only contain valid users and groups.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import argparse
+import base64
+import json
+import logging
+
+from .interface import DirectoryProvider
+
+from . import CONFIG
+
+logger: logging.Logger = logging.getLogger("snapshot")
+
+# Object classes of LDIF entries, which are groups even if they have no members.
+GROUP_OBJECT_CLASSES = ("posixgroup", "groupofnames", "groupofuniquenames", "groupofmembers", "group")
+
+
+def parse_ldif(lines: List[str]) -> List[Tuple[str, Dict[str, List[str]]]]:
+    """
+    Parse the content entries of an LDIF file.
+
+    Returns a list of tuples of the dn and the attributes of each entry.
+    The attribute names are lower case.
+    """
+    entries: List[Tuple[str, Dict[str, List[str]]]] = []
+    unfolded: List[str] = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith(" ") and unfolded:
+            unfolded[-1] += line[1:]
+        else:
+            unfolded.append(line)
+    unfolded.append("")
+
+    dn: Optional[str] = None
+    attributes: Dict[str, List[str]] = {}
+    for line in unfolded:
+        if line == "":
+            if dn is not None:
+                entries.append((dn, attributes))
+            dn = None
+            attributes = {}
+            continue
+        if line.startswith("#") or ":" not in line:
+            continue
+        name, value = line.split(":", 1)
+        if value.startswith(":"):
+            value = base64.b64decode(value[1:].strip()).decode("utf-8")
+        else:
+            value = value.strip()
+        name = name.lower()
+        if name == "version" and dn is None:
+            continue
+        if name == "dn":
+            dn = value
+        else:
+            attributes.setdefault(name, []).append(value)
+    return entries
+
+
+def split_dn(dn: str) -> List[str]:
+    """
+    Split the given dn into its RDNs in a normalized form for comparisons.
+
+    Attribute types and values are lower case and whitespace around the separators is removed.
+    """
+    rdns: List[str] = []
+    current = ""
+    escaped = False
+    for char in dn:
+        if escaped:
+            current += char
+            escaped = False
+        elif char == "\\":
+            current += char
+            escaped = True
+        elif char == ",":
+            rdns.append(current)
+            current = ""
+        else:
+            current += char
+    rdns.append(current)
+
+    normalized: List[str] = []
+    for rdn in rdns:
+        if "=" in rdn:
+            name, value = rdn.split("=", 1)
+            normalized.append(name.strip().lower() + "=" + value.strip().lower())
+        elif rdn.strip():
+            normalized.append(rdn.strip().lower())
+    return normalized
+
+
+def normalize_dn(dn: str) -> str:
+    """Normalize the given dn for comparisons."""
+    return ",".join(split_dn(dn))
+
+
+class SnapshotDirectory(DirectoryProvider):
+    """Directory provider answering all queries from a snapshot held in memory."""
+
+    def __init__(self):
+        """Init this class and load the snapshot."""
+        if "snapshot" not in CONFIG:
+            logger.error("The snapshot directory requires a snapshot section in the config.")
+            exit(1)
+        snapshot_config = CONFIG["snapshot"]
+        ldap_config = CONFIG["LDAP"] if "LDAP" in CONFIG else CONFIG[CONFIG.default_section]
+
+        def get(key: str, default: Optional[str]) -> Optional[str]:
+            return snapshot_config.get(key, fallback=ldap_config.get(key, default))
+
+        # The path of the snapshot file.
+        self.path: str = snapshot_config.get("path")
+        if not self.path:
+            logger.error("The snapshot section of the config has no path.")
+            exit(1)
+        # The format of the snapshot file: json or ldif. Defaults to ldif for files ending in .ldif.
+        self.format: str = snapshot_config.get("format", fallback="ldif" if self.path.endswith(".ldif") else "json")
+        # Whether to use the memberOf field of the users for group lookups, like the LDAP option.
+        self.use_memberof: bool = snapshot_config.getboolean(
+            "use_memberof", fallback=ldap_config.getboolean("use_memberof", fallback=False))
+        # The following options are only used for LDIF files. They default to the values of the LDAP section.
+        # The search bases are used to tell users and groups apart.
+        self.user_search_base: Optional[str] = get("user_search_base", None)
+        self.group_search_base: Optional[str] = get("group_search_base", None)
+        self.user_uid_field: str = get("user_uid_field", "uid")
+        self.user_primary_mail_field: str = get("user_primary_mail_field", "mail")
+        self.group_id_field: str = get("group_id_field", "cn")
+        self.group_membership_field: str = get("group_membership_field", "memberUid")
+
+        # uid -> primary mail
+        self.mails: Dict[str, Optional[str]] = {}
+        # lower case group id -> uids of the members
+        self.group_members: Dict[str, List[str]] = {}
+        # lower case group id -> group dn
+        self.group_dns: Dict[str, str] = {}
+        # normalized group dn -> uids of the users having the group in their memberOf field
+        self.memberof: Dict[str, List[str]] = {}
+
+        logger.info("Loading {} snapshot from {}".format(self.format, self.path))
+        with open(self.path) as f:
+            if self.format == "ldif":
+                snapshot = self.snapshot_from_ldif(parse_ldif(f.readlines()))
+            else:
+                snapshot = json.load(f)
+        self.load(snapshot)
+        logger.info("Loaded {} users and {} groups".format(len(self.mails), len(self.group_members)))
+
+    @classmethod
+    def in_base(cls, dn: str, base: Optional[str]) -> bool:
+        """Whether the given dn is within the given search base. Always true, if no base is given."""
+        if not base:
+            return True
+        base_rdns = split_dn(base)
+        return split_dn(dn)[-len(base_rdns):] == base_rdns
+
+    def snapshot_from_ldif(self, entries: List[Tuple[str, Dict[str, List[str]]]]) -> Dict[str, Any]:
+        """Convert the given LDIF entries into the JSON snapshot format."""
+        uid_field = self.user_uid_field.lower()
+        mail_field = self.user_primary_mail_field.lower()
+        id_field = self.group_id_field.lower()
+        membership_field = self.group_membership_field.lower()
+
+        users: Dict[str, Dict[str, Any]] = {}
+        groups: Dict[str, Dict[str, Any]] = {}
+        for dn, attributes in entries:
+            if uid_field in attributes and SnapshotDirectory.in_base(dn, self.user_search_base):
+                mails = attributes.get(mail_field, [])
+                users[attributes[uid_field][0]] = {
+                    "mail": mails[0] if mails else None,
+                    "memberOf": attributes.get("memberof", []),
+                }
+            elif (id_field in attributes and SnapshotDirectory.in_base(dn, self.group_search_base)
+                  and (membership_field in attributes
+                       or any(object_class.lower() in GROUP_OBJECT_CLASSES
+                              for object_class in attributes.get("objectclass", [])))):
+                groups[attributes[id_field][0]] = {
+                    "dn": dn,
+                    "members": attributes.get(membership_field, []),
+                }
+        return {"users": users, "groups": groups}
+
+    def load(self, snapshot: Dict[str, Any]):
+        """Build the indexes from the given snapshot."""
+        for uid, user in snapshot.get("users", {}).items():
+            self.mails[uid] = user.get("mail")
+            for group_dn in user.get("memberOf", []):
+                self.memberof.setdefault(normalize_dn(group_dn), []).append(uid)
+        for group, data in snapshot.get("groups", {}).items():
+            self.group_members[group.lower()] = data.get("members", [])
+            if data.get("dn"):
+                self.group_dns[group.lower()] = data["dn"]
+
+    def get_user_primary_mails(self, users: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """Get a list of tuples of uids and the primary email addresses of the users with the given uids."""
+        logger.debug("Getting primary mails for users {}".format(str(users)))
+        result: List[Tuple[str, Optional[str]]] = []
+        for user in users:
+            mail = self.mails.get(user)
+            if mail is None:
+                logger.warn("No primary mail found for user {}".format(user))
+            result.append((user, mail))
+        return result
+
+    def get_uids_and_primary_mails_for_group(self, group: str) -> List[Tuple[str, Optional[str]]]:
+        """Get a tuple of uid and the primary email addresses for each user in the group."""
+        logger.debug("Getting primary mails for users in group {}".format(group))
+        if not self.use_memberof:
+            users = self.group_members.get(group.lower(), [])
+            if users == []:
+                logger.warn("Group {} has no members.".format(group))
+                return []
+            return self.get_user_primary_mails(users)
+
+        if group.lower() not in self.group_dns:
+            logger.error("Cannot find the group {}".format(group))
+            if CONFIG["main"].getboolean("strict"):
+                exit(1)
+            return []
+        users = self.memberof.get(normalize_dn(self.group_dns[group.lower()]), [])
+        if users == []:
+            logger.warn("Group {} has no members.".format(group))
+            return []
+        return [(user, self.mails[user]) for user in users]
+
+
+def export_snapshot(snapshot_file: str):
+    """Write a JSON snapshot of all valid users and groups of the LDAP server to the given file."""
+    from .ldap import LDAPConnector
+
+    snapshot = LDAPConnector().get_snapshot()
+    with open(snapshot_file, 'w') as f:
+        json.dump(snapshot, f, indent=2, sort_keys=True)
+
+
+def main():
+    """Run the snapshot exporter."""
+    from .main import EnvDefault, load_config
+
+    parser = argparse.ArgumentParser(description='Export a snapshot of the LDAP directory for offline generation')
+    parser.add_argument('--config', '-c', metavar='file', action=EnvDefault, envvar='MAC_CONFIG', required=False, default="./mac.conf",
+                        help='The config file to use. Defaults to "./mac.conf". Can also be specified via the environment variable MAC_CONFIG')
+    parser.add_argument('snapshot_file',
+                        help='The JSON file to write the snapshot to.')
+
+    args = parser.parse_args()
+    load_config(args.config)
+    export_snapshot(args.snapshot_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""Shared fixtures for the tests."""
+from typing import Callable, Dict
+
+import pytest
+
+from mail_alias_creator import CONFIG
+
+
+@pytest.fixture
+def config() -> Callable[[Dict[str, Dict[str, str]]], None]:
+    """Replace the global config by the given sections for the duration of the test."""
+    def set_config(sections: Dict[str, Dict[str, str]]):
+        for section in CONFIG.sections():
+            CONFIG.remove_section(section)
+        CONFIG.read_dict(sections)
+
+    yield set_config
+    for section in CONFIG.sections():
+        CONFIG.remove_section(section)
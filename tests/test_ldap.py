@@ -0,0 +1,118 @@
+"""Tests for the server selection and retry handling of the LDAP connector."""
+from typing import Any, Dict, List
+
+import pytest
+
+pytest.importorskip("ldap3")
+
+from ldap3.core.exceptions import LDAPBindError, LDAPSocketOpenError  # noqa: E402
+
+from mail_alias_creator import ldap  # noqa: E402
+from mail_alias_creator.ldap import LDAPConnector, TransientResultError  # noqa: E402
+
+
+class FakeConnection():
+    """Connection answering every search with the given result code."""
+
+    def __init__(self, server, result_code: int = 0):
+        self.server = server
+        self.result: Dict[str, Any] = {"result": result_code, "description": "", "message": ""}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def search(self, search_base, search_filter, attributes=None) -> bool:
+        return self.result["result"] == 0
+
+
+@pytest.fixture
+def connector(config, monkeypatch) -> LDAPConnector:
+    config({
+        "main": {},
+        "LDAP": {
+            "uri": "ldap://one, ldap://two ldap://three",
+            "retries": "3",
+            "retry_backoff": "0.5",
+            "retry_backoff_max": "1",
+        },
+    })
+    sleeps: List[float] = []
+    monkeypatch.setattr(ldap.time, "sleep", sleeps.append)
+    connector = LDAPConnector()
+    connector.sleeps = sleeps
+    return connector
+
+
+def names(connector: LDAPConnector) -> List[str]:
+    return [health.server.host for health in connector.ordered_servers()]
+
+
+def test_multiple_uris(connector):
+    assert names(connector) == ["one", "two", "three"]
+
+
+def test_ordered_by_health_and_latency(connector):
+    one, two, three = connector.servers
+    one.record_latency(0.5)
+    two.record_latency(0.1)
+    assert names(connector) == ["three", "two", "one"]
+    three.record_failure()
+    assert names(connector) == ["two", "one", "three"]
+    three.record_latency(0.01)
+    assert names(connector) == ["three", "two", "one"]
+
+
+def test_failover_on_connection_error(connector, monkeypatch):
+    def connect(health):
+        if health.server.host == "one":
+            raise LDAPSocketOpenError("unreachable")
+        return FakeConnection(health.server)
+
+    monkeypatch.setattr(connector, "connect", connect)
+    assert connector.run(lambda conn: conn.server.host) == "two"
+    assert [health.failures for health in connector.servers] == [1, 0, 0]
+    assert connector.sleeps == []
+
+
+def test_failover_on_busy_server(connector, monkeypatch):
+    def connect(health):
+        return FakeConnection(health.server, 51 if health.server.host == "one" else 0)
+
+    monkeypatch.setattr(connector, "connect", connect)
+    result = connector.run(lambda conn: (connector.search(conn, "ou=users", "(uid=a)", None), conn.server.host))
+    assert result == (True, "two")
+    assert connector.servers[0].failures == 1
+    assert connector.servers[1].latency is not None
+
+
+def test_busy_result_raises(connector):
+    with pytest.raises(TransientResultError):
+        connector.search(FakeConnection(connector.servers[0].server, 52), "ou=users", "(uid=a)", None)
+
+
+def test_not_found_is_no_error(connector):
+    assert connector.search(FakeConnection(connector.servers[0].server, 32), "ou=users", "(uid=a)", None) is False
+
+
+def test_backoff_when_all_servers_fail(connector, monkeypatch):
+    def connect(health):
+        raise LDAPSocketOpenError("unreachable")
+
+    monkeypatch.setattr(connector, "connect", connect)
+    with pytest.raises(ConnectionError):
+        connector.run(lambda conn: None)
+    assert connector.sleeps == [0.5, 1, 1]
+    assert [health.failures for health in connector.servers] == [4, 4, 4]
+
+
+def test_bind_error_is_not_retried(connector, monkeypatch):
+    def connect(health):
+        raise LDAPBindError("invalid credentials")
+
+    monkeypatch.setattr(connector, "connect", connect)
+    with pytest.raises(ConnectionError):
+        connector.run(lambda conn: None)
+    assert connector.sleeps == []
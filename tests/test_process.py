@@ -0,0 +1,65 @@
+"""Tests for the reverse indexes built by the processor."""
+from typing import List, Optional, Tuple
+
+import pytest
+
+from mail_alias_creator import main
+from mail_alias_creator.interface import DirectoryProvider
+from mail_alias_creator.process import Processor
+
+ALIASES = """meta:
+  name: test
+  description: Aliases for the tests
+aliases:
+  team@example.com:
+    entries:
+      - kind: user
+        user: alice
+      - kind: external_address
+        address: partner@example.org
+  all@example.com:
+    entries:
+      - kind: include_alias
+        alias: team@example.com
+      - kind: include_alias
+        alias: missing@example.com
+      - kind: include_alias
+      - kind: user
+        user: bob
+        forbidReceive: true
+"""
+
+
+class Directory(DirectoryProvider):
+    """Directory with the users alice and bob."""
+
+    def get_user_primary_mails(self, users: List[str]) -> List[Tuple[str, Optional[str]]]:
+        return [(user, user + "@example.com") for user in users]
+
+
+@pytest.fixture
+def processor(config, tmp_path, monkeypatch) -> Processor:
+    config({"main": {}})
+    monkeypatch.setattr(main, "DIRECTORY", Directory())
+    alias_file = tmp_path / "aliases.yml"
+    alias_file.write_text(ALIASES)
+    processor = Processor()
+    processor.load_files([str(alias_file)])
+    processor.process()
+    return processor
+
+
+def test_index(processor):
+    assert processor.get_index() == {
+        "senders": {
+            "alice": ["team@example.com", "all@example.com"],
+            "bob": ["all@example.com"],
+        },
+        "recipients": {
+            "alice@example.com": ["team@example.com", "all@example.com"],
+            "partner@example.org": ["team@example.com", "all@example.com"],
+        },
+        "included_by": {
+            "team@example.com": ["all@example.com"],
+        },
+    }
@@ -0,0 +1,117 @@
+"""Tests for the offline snapshot directory."""
+import json
+
+import pytest
+
+from mail_alias_creator.snapshot import SnapshotDirectory, parse_ldif, split_dn
+
+LDIF = """version: 1
+
+# a comment
+dn: uid=alice,ou=users,dc=example
+objectClass: posixAccount
+uid: alice
+mail: alice@example.com
+memberOf: cn=Staff,ou=groups,dc=example
+
+dn: uid=bob,ou=users,dc=example
+uid: bob
+mail:: Ym9iQGV4YW1wbGUuY29t
+memberOf: CN=staff, OU=groups, DC=example
+
+dn: cn=Staff,ou=groups,dc=example
+objectClass: posixGroup
+cn: Staff
+memberUid: alice
+memberUid: b
+ ob
+memberUid: carol
+
+dn: cn=empty,ou=groups,dc=example
+objectClass: groupOfNames
+cn: empty
+
+dn: cn=service,ou=services,dc=example
+cn: service
+"""
+
+SNAPSHOT = {
+    "users": {
+        "alice": {"mail": "alice@example.com", "memberOf": ["cn=staff,ou=groups,dc=example"]},
+        "bob": {"mail": "bob@example.com", "memberOf": []},
+    },
+    "groups": {
+        "staff": {"dn": "cn=staff,ou=groups,dc=example", "members": ["alice", "bob"]},
+    },
+}
+
+
+def test_parse_ldif():
+    entries = dict(parse_ldif(LDIF.splitlines(True)))
+    assert entries["uid=bob,ou=users,dc=example"]["mail"] == ["bob@example.com"]
+    assert entries["cn=Staff,ou=groups,dc=example"]["memberuid"] == ["alice", "bob", "carol"]
+    assert len(entries) == 5
+
+
+def test_split_dn():
+    assert split_dn("CN=Foo Bar , OU=groups,dc=example") == ["cn=foo bar", "ou=groups", "dc=example"]
+    assert split_dn(r"cn=a\,b,dc=example") == [r"cn=a\,b", "dc=example"]
+
+
+def test_in_base():
+    assert SnapshotDirectory.in_base("cn=a,ou=groups,dc=example", "ou=groups, dc=example")
+    assert not SnapshotDirectory.in_base("cn=a,ou=oldgroups,dc=example", "ou=groups,dc=example")
+    assert SnapshotDirectory.in_base("cn=a,ou=groups,dc=example", None)
+
+
+@pytest.fixture
+def ldif_file(tmp_path):
+    path = tmp_path / "directory.ldif"
+    path.write_text(LDIF)
+    return str(path)
+
+
+@pytest.fixture
+def json_file(tmp_path):
+    path = tmp_path / "directory.json"
+    path.write_text(json.dumps(SNAPSHOT))
+    return str(path)
+
+
+def test_ldif_members(config, ldif_file):
+    config({"main": {}, "snapshot": {"path": ldif_file}})
+    directory = SnapshotDirectory()
+    assert sorted(directory.group_members) == ["empty", "staff"]
+    assert directory.get_uids_and_primary_mails_for_group("STAFF") == [
+        ("alice", "alice@example.com"), ("bob", "bob@example.com"), ("carol", None)]
+    assert directory.get_uids_and_primary_mails_for_group("empty") == []
+
+
+def test_ldif_memberof(config, ldif_file):
+    config({"main": {}, "LDAP": {"use_memberof": "true"}, "snapshot": {"path": ldif_file}})
+    directory = SnapshotDirectory()
+    assert directory.use_memberof
+    assert directory.get_uids_and_primary_mails_for_group("staff") == [
+        ("alice", "alice@example.com"), ("bob", "bob@example.com")]
+    assert directory.get_uids_and_primary_mails_for_group("missing") == []
+
+
+def test_json(config, json_file):
+    config({"main": {}, "snapshot": {"path": json_file}})
+    directory = SnapshotDirectory()
+    assert directory.get_user_primary_mails(["bob", "nobody"]) == [("bob", "bob@example.com"), ("nobody", None)]
+    assert directory.get_uids_and_primary_mails_for_group("Staff") == [
+        ("alice", "alice@example.com"), ("bob", "bob@example.com")]
+
+
+def test_json_memberof(config, json_file):
+    config({"main": {}, "snapshot": {"path": json_file, "use_memberof": "yes"}})
+    directory = SnapshotDirectory()
+    assert directory.get_uids_and_primary_mails_for_group("staff") == [("alice", "alice@example.com")]
+
+
+@pytest.mark.parametrize("sections", [{"main": {}}, {"main": {}, "snapshot": {}}])
+def test_missing_config(config, sections):
+    config(sections)
+    with pytest.raises(SystemExit):
+        SnapshotDirectory()